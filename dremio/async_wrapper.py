@@ -0,0 +1,386 @@
+import asyncio
+import logging
+import random
+import time
+from urllib.parse import quote
+
+import aiohttp
+import aiolimiter
+
+from dremio.exceptions import DremioException
+
+_log = logging.getLogger('dremio.async_wrapper')
+_TERMINAL_STATES = frozenset({'COMPLETED', 'CANCELED', 'FAILED'})
+
+
+class AsyncDremioWrapper:
+    # path normalisation: dots become slashes and quotes are dropped
+    _PATH_TABLE = str.maketrans({'.': '/', '"': ''})
+
+    _ELEMENT_TYPES = frozenset({'folder', 'space'})
+    _ELEMENT_PAYLOADS = {
+        'space': lambda name: {'entityType': 'space', 'name': name},
+        'folder': lambda path: {'entityType': 'folder', 'path': path.split('/')},
+    }
+
+    def __init__(self, host: str, username: str, password: str, max_rps: float = 20, concurrency: int = 16):
+        # dremio
+        self._host = host
+        self._username = username
+        self._password = password
+
+        # api
+        self._url_login = f'{self._host}/apiv2/login'
+        self._url_sql = f'{self._host}/api/v3/sql'
+        self._url_jobstatus = f'{self._host}/api/v3/job/'
+        self._url_manage = f'{self._host}/api/v3/catalog'
+        self._url_view = f'{self._host}/api/v3/catalog/by-path/'
+        self._url_documentation_tpl = f'{self._host}/api/v3/catalog/{{eid}}/collaboration/wiki'
+        self._url_reflection = f'{self._host}/api/v3/reflection'
+        self._url_refresh_pds_tpl = f'{self._host}/api/v3/catalog/{{eid}}'
+
+        # http (created lazily, it must be bound to the running event loop)
+        self._session = None
+        self._limiter = aiolimiter.AsyncLimiter(max_rps, 1)
+        self._concurrency = concurrency or 16
+        self._sem = None
+
+        # auth
+        self._token = None
+        self._token_expires_at = 0
+        self._auth_headers = None
+        self._token_lock = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        """
+        Close the underlying HTTP session and its pooled connections.
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            # the connector pools up to 64 connections per host, but at most `concurrency`
+            # requests are in flight at once (see _request)
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=64, keepalive_timeout=75)
+            )
+        return self._session
+
+    async def _request(self, method: str, url: str, **kwargs) -> aiohttp.ClientResponse:
+        """
+        Send a rate limited request and read its body, releasing the connection back to the pool.
+        At most `concurrency` requests are in flight at once.
+        Requests throttled by Dremio (HTTP 429) are retried, honouring the Retry-After header.
+        :param method: HTTP method.
+        :param url: target url.
+        :return: response (body already read).
+        """
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self._concurrency)
+        delay = 0.5
+        max_tries = 5
+        while True:
+            max_tries -= 1
+            async with self._sem:
+                async with self._limiter:
+                    response = await self._get_session().request(method, url, **kwargs)
+                    await response.read()
+            if response.status != 429 or max_tries == 0:
+                return response
+            retry_after = response.headers.get('Retry-After')
+            if retry_after and retry_after.isdigit():
+                await asyncio.sleep(min(int(retry_after), 30))
+            else:
+                await asyncio.sleep(delay + random.uniform(0, delay * 0.1))
+                delay = min(delay * 2, 30.0)
+
+    async def get_token(self) -> str:
+        """
+        Get the API token. The token is cached and only renewed near expiry.
+        :return: token
+        """
+        if self._token_lock is None:
+            self._token_lock = asyncio.Lock()
+        async with self._token_lock:
+            if self._token and time.monotonic() < self._token_expires_at - 30:
+                return self._token
+            data = {
+                'userName': self._username,
+                'password': self._password
+            }
+            response = await self._request(
+                'POST',
+                url=self._url_login,
+                json=data
+            )
+            token = None
+            if response.status == 200:
+                token = (await response.json()).get('token', None)
+            if token:
+                self._token = token
+                self._auth_headers = {
+                    'Authorization': f'_dremio{token}',
+                    'Content-Type': 'application/json',
+                    'cache-control': 'no-cache'
+                }
+                # dremio tokens are long-lived
+                self._token_expires_at = time.monotonic() + 24 * 3600
+                return token
+            else:
+                raise DremioException(await response.text())
+
+    async def _authed_request(self, method: str, url: str, **kwargs) -> aiohttp.ClientResponse:
+        """
+        Send an authenticated request, logging in again once if the token was rejected.
+        :param method: HTTP method.
+        :param url: target url.
+        :return: response (body already read).
+        """
+        for _ in range(2):
+            await self.get_token()
+            response = await self._request(method, url, headers=self._auth_headers, **kwargs)
+            if response.status != 401:
+                break
+            self._token = None
+        return response
+
+    async def create_element(self, element_type: str, element_name_or_path: str) -> str:
+        """
+        Create a Dremio element.
+        :param element_type: may be 'folder' or 'space'.
+        :param element_name_or_path: desired path into Dremio.
+        :return: Dremio ID of the element.
+        """
+        if element_type not in self._ELEMENT_TYPES:
+            raise ValueError(element_type)
+        data = self._ELEMENT_PAYLOADS[element_type](element_name_or_path)
+        result = None
+        response = await self._authed_request(
+            'POST',
+            url=self._url_manage,
+            json=data
+        )
+        if response.status == 200:
+            result = (await response.json()).get('id', None)
+        elif response.status == 409:
+            result = 'already exists'
+        if result:
+            return result
+        else:
+            raise DremioException(await response.text())
+
+    async def delete_element(self, element_id: str) -> str:
+        """
+        Remove a Dremio element.
+        :param element_id: Dremio ID of element.
+        :return: confirmation.
+        """
+        result = None
+        response = await self._authed_request(
+            'DELETE',
+            url=f'{self._url_manage}/{element_id}',
+        )
+        if response.status == 204:
+            result = 'removed'
+        if result:
+            return result
+        else:
+            raise DremioException(await response.text())
+
+    async def get_run_status(self, id: str) -> str:
+        """
+        Get the status of a Dremio operation.
+        :param id: Job ID.
+        :return: 'COMPLETED', 'CANCELED' or 'FAILED'
+        """
+        result = None
+        delay = 0.05
+        max_delay = 5.0
+        deadline = time.monotonic() + 30 * 60
+        url = self._url_jobstatus + id
+        while result not in _TERMINAL_STATES and time.monotonic() < deadline:
+            response = await self._authed_request(
+                'GET',
+                url=url,
+            )
+            if response.status == 200:
+                result = (await response.json()).get('jobState', None)
+            if result not in _TERMINAL_STATES:
+                await asyncio.sleep(delay + random.uniform(0, delay * 0.1))
+                delay = min(delay * 1.7, max_delay)
+        if result:
+            return result
+        else:
+            raise DremioException(await response.text())
+
+    async def run_sql(self, command: str) -> str:
+        """
+        Run a query into Dremio.
+        :param command: sql query.
+        :return: 'COMPLETED', 'CANCELED' or 'FAILED'
+        """
+        payload = {
+            'sql': command
+        }
+        response = await self._authed_request(
+            'POST',
+            url=self._url_sql,
+            json=payload,
+        )
+        job = None
+        if response.status == 200:
+            job = (await response.json()).get('id', None)
+        if job:
+            return await self.get_run_status(id=job)
+        else:
+            raise DremioException(await response.text())
+
+    async def get_element_id(self, path: str) -> str:
+        """
+        Get Dremio element ID.
+        :param path: path of element (like source/folder1/folder2/my_file.csv or source/folder1/folder2)
+        :return: Dremio element ID
+        """
+        path = path.translate(self._PATH_TABLE)
+        result = None
+        delay = 0.05
+        max_delay = 1.0
+        deadline = time.monotonic() + 5
+        url = self._url_view + path
+        while not result and time.monotonic() < deadline:
+            response = await self._authed_request(
+                'GET',
+                url=url,
+            )
+            if response.status == 200:
+                result = (await response.json()).get('id', None)
+            if not result:
+                await asyncio.sleep(delay + random.uniform(0, delay * 0.1))
+                delay = min(delay * 1.7, max_delay)
+        if result:
+            return result
+        else:
+            raise DremioException(await response.text())
+
+    async def create_documentation(self, element_id: str, text: str) -> str:
+        """
+        Create documentation for VDS.
+        :param element_id: Dremio ID for VDS.
+        :param text: markdown text to be documented.
+        :return: confirmation.
+        """
+        _log.info('Creating or replacing documentation for %s...', element_id)
+
+        # recovering version number
+        response = await self._authed_request(
+            'GET',
+            url=self._url_documentation_tpl.format(eid=element_id),
+        )
+        version = None
+        if response.status == 200:
+            version = (await response.json()).get('version', None)
+        data = {
+            'text': text
+        }
+        if version is not None:
+            data['version'] = version
+
+        response = await self._authed_request(
+            'POST',
+            url=self._url_documentation_tpl.format(eid=element_id),
+            json=data
+        )
+        if response.status == 200:
+            _log.info('Documentation done!')
+            return 'ok'
+        else:
+            text = await response.text()
+            _log.error('Documentation creation error: %s', text)
+            raise DremioException(text)
+
+    async def create_or_replace_vds(self, vds_path: str, query: str, docs: str = None):
+        """
+        Create (or replace) a VDS.
+        :param vds_path: desired path for VDS.
+        :param query: sql query to mount VDS.
+        :param docs: markdown text for documentation.
+        """
+        _log.info('Creating or replacing VDS %s...', vds_path)
+
+        qheader = f'CREATE OR REPLACE VDS {vds_path} AS'
+        result = await self.run_sql(
+            command=f'{qheader} {query}',
+        )
+        if 'FAILED' in result:
+            _log.error('Creation failed! Error in query %s', query)
+            raise DremioException(result)
+        if docs:
+            eid = await self.get_element_id(path=vds_path)
+            await self.create_documentation(element_id=eid, text=docs)
+        _log.info('VDS done!')
+
+    async def create_or_replace_vds_many(self, specs: list) -> list:
+        """
+        Create (or replace) many VDS concurrently.
+        :param specs: list of dicts with the create_or_replace_vds arguments (vds_path, query and optionally docs).
+        :return: list with None for each created VDS or the raised exception, in the same order as specs.
+        """
+        return await asyncio.gather(
+            *(self.create_or_replace_vds(**spec) for spec in specs),
+            return_exceptions=True
+        )
+
+    async def refresh_parquet_pds(self, pds_path: str) -> str:
+        """
+        Refresh a parquet PDS.
+        :param pds_path: path of PDS.
+        :return: confirmation.
+        """
+        pds_path = pds_path.translate(self._PATH_TABLE)
+        path_parts = pds_path.split('/')
+        _log.info('Checking already existing PDS...')
+        element_id_antigo = await self.get_element_id(path=pds_path)
+        # folders not yet promoted to a dataset have a path based ID, like dremio:/source/folder
+        if pds_path not in element_id_antigo:
+            _log.info('Removing old PDS...')
+            try:
+                await self.delete_element(element_id_antigo)
+                _log.info('Old PDS removed!')
+            except DremioException:
+                _log.info('PDS not found...')
+            element_id = await self.get_element_id(path=pds_path)
+        else:
+            _log.info('PDS not found...')
+            element_id = element_id_antigo
+
+        _log.info('Creating new PDS...')
+        payload = {
+            'entityType': 'dataset',
+            'id': element_id,
+            'path': path_parts,
+            'type': 'PHYSICAL_DATASET',
+            'format': {
+                'type': 'Parquet'
+            }
+        }
+        element_id_quoted = quote(element_id, safe='')
+        response = await self._authed_request(
+            'POST',
+            url=self._url_refresh_pds_tpl.format(eid=element_id_quoted),
+            json=payload,
+        )
+        result = None
+        if response.status == 200:
+            result = (await response.json()).get('id', None)
+        else:
+            raise DremioException(await response.text())
+        _log.info('Done!')
+        return result
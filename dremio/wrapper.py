@@ -1,17 +1,76 @@
 import logging
-import sys
+import random
+import threading
 import time
 from urllib.parse import quote
 
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from dremio.exceptions import DremioException
 
-logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+_log = logging.getLogger('dremio.wrapper')
+
+_OK = 200
+_NO_CONTENT = 204
+_UNAUTHORIZED = 401
+_CONFLICT = 409
+_TERMINAL_STATES = frozenset({'COMPLETED', 'CANCELED', 'FAILED'})
+
+_SHARED_SESSION = None
+_SHARED_SESSION_LOCK = threading.Lock()
+
+
+def _get_shared_session() -> requests.Session:
+    """
+    Get the process-wide session, so every wrapper shares the same connection pool.
+    :return: session
+    """
+    global _SHARED_SESSION
+    with _SHARED_SESSION_LOCK:
+        if _SHARED_SESSION is None:
+            session = requests.Session()
+            # only idempotent calls are retried, sql submissions are retried by run_sql
+            retry = Retry(
+                total=5,
+                backoff_factor=0.3,
+                status_forcelist=(502, 503, 504),
+                allowed_methods=frozenset(['GET', 'DELETE']),
+                respect_retry_after_header=True,
+                # hand the last response back, so callers raise DremioException as usual
+                raise_on_status=False
+            )
+            adapter = HTTPAdapter(pool_connections=32, pool_maxsize=128, max_retries=retry)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _SHARED_SESSION = session
+        return _SHARED_SESSION
+
+
+def close_shared_session():
+    """
+    Close the process-wide session and its pooled connections. Wrappers created afterwards get a new one.
+    """
+    global _SHARED_SESSION
+    with _SHARED_SESSION_LOCK:
+        if _SHARED_SESSION is not None:
+            _SHARED_SESSION.close()
+            _SHARED_SESSION = None
 
 
 class DremioWrapper:
-    def __init__(self, host: str, username: str, password: str):
+    # path normalisation: dots become slashes and quotes are dropped
+    _PATH_TABLE = str.maketrans({'.': '/', '"': ''})
+
+    _ELEMENT_TYPES = frozenset({'folder', 'space'})
+    _ELEMENT_PAYLOADS = {
+        'space': lambda name: {'entityType': 'space', 'name': name},
+        'folder': lambda path: {'entityType': 'folder', 'path': path.split('/')},
+    }
+
+    def __init__(self, host: str, username: str, password: str, session: requests.Session = None):
         # dremio
         self._host = host
         self._username = username
@@ -23,31 +82,83 @@ class DremioWrapper:
         self._url_jobstatus = f'{self._host}/api/v3/job/'
         self._url_manage = f'{self._host}/api/v3/catalog'
         self._url_view = f'{self._host}/api/v3/catalog/by-path/'
-        self._url_documentation = f'{self._host}/api/v3/catalog/@@@@@/collaboration/wiki'
+        self._url_documentation_tpl = f'{self._host}/api/v3/catalog/{{eid}}/collaboration/wiki'
         self._url_reflection = f'{self._host}/api/v3/reflection'
-        self._url_refresh_pds = f'{self._host}/api/v3/catalog/@@@@@'
+        self._url_refresh_pds_tpl = f'{self._host}/api/v3/catalog/{{eid}}'
+
+        # http
+        self._session = session if session is not None else _get_shared_session()
+
+        # auth
+        self._token = None
+        self._token_expires_at = 0
+        self._auth_headers = None
+
+        # cache
+        self._path_id_cache = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Does nothing, kept so the wrapper can be used as a context manager. An injected session belongs
+        to the caller and the process-wide one is released with close_shared_session().
+        """
 
     def get_token(self) -> str:
         """
-        Get the API token
+        Get the API token. The token is cached and only renewed near expiry.
         :return: token
         """
+        if self._token and time.monotonic() < self._token_expires_at - 30:
+            return self._token
         data = {
             'userName': self._username,
             'password': self._password
         }
-        response = requests.post(
+        response = self._session.post(
             url=self._url_login,
-            json=data
+            data=orjson.dumps(data),
+            headers={'Content-Type': 'application/json'}
         )
         token = None
-        if response.status_code == requests.codes.ok:
-            token = response.json().get('token', None)
+        if response.status_code == _OK:
+            token = orjson.loads(response.content).get('token', None)
         if token:
+            self._token = token
+            self._auth_headers = {
+                'Authorization': f'_dremio{token}',
+                'Content-Type': 'application/json',
+                'cache-control': 'no-cache'
+            }
+            # dremio tokens are long-lived
+            self._token_expires_at = time.monotonic() + 24 * 3600
             return token
         else:
             raise DremioException(response.text)
 
+    def _authed_request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Send an authenticated request, logging in again once if the token was rejected.
+        :param method: HTTP method.
+        :param url: target url.
+        :return: response.
+        """
+        for attempt in range(2):
+            self.get_token()
+            response = self._session.request(method, url, headers=self._auth_headers, **kwargs)
+            if response.status_code != _UNAUTHORIZED:
+                break
+            if attempt == 0:
+                # keep the last response readable for the caller's error message
+                response.close()
+            self._token = None
+        return response
+
     def create_element(self, element_type: str, element_name_or_path: str) -> str:
         """
         Create a Dremio element.
@@ -55,32 +166,18 @@ class DremioWrapper:
         :param element_name_or_path: desired path into Dremio.
         :return: Dremio ID of the element.
         """
-        assert element_type in ['folder', 'space']
-        token = self.get_token()
-        header = {
-            'Authorization': f'_dremio{token}',
-            'Content-Type': 'application/json',
-            'cache-control': 'no-cache'
-        }
-        if element_type == 'space':
-            data = {
-                'entityType': element_type,
-                'name': element_name_or_path,
-            }
-        elif element_type == 'folder':
-            data = {
-                'entityType': element_type,
-                'path': element_name_or_path.split('/'),
-            }
+        if element_type not in self._ELEMENT_TYPES:
+            raise ValueError(element_type)
+        data = self._ELEMENT_PAYLOADS[element_type](element_name_or_path)
         result = None
-        response = requests.post(
+        response = self._authed_request(
+            'POST',
             url=self._url_manage,
-            headers=header,
-            json=data
+            data=orjson.dumps(data)
         )
-        if response.status_code == requests.codes.ok:
-            result = response.json().get('id', None)
-        elif response.status_code == requests.codes.conflict:
+        if response.status_code == _OK:
+            result = orjson.loads(response.content).get('id', None)
+        elif response.status_code == _CONFLICT:
             result = 'already exists'
         if result:
             return result
@@ -93,19 +190,16 @@ class DremioWrapper:
         :param element_id: Dremio ID of element.
         :return: confirmation.
         """
-        token = self.get_token()
-        header = {
-            'Authorization': f'_dremio{token}',
-            'Content-Type': 'application/json',
-            'cache-control': 'no-cache'
-        }
         result = None
-        response = requests.delete(
+        response = self._authed_request(
+            'DELETE',
             url=f'{self._url_manage}/{element_id}',
-            headers=header,
+            stream=True,
         )
-        if response.status_code == requests.codes.no_content:
+        if response.status_code == _NO_CONTENT:
             result = 'removed'
+            # no body to read, give the connection back to the pool
+            response.close()
         if result:
             return result
         else:
@@ -117,88 +211,109 @@ class DremioWrapper:
         :param id: Job ID.
         :return: 'COMPLETED', 'CANCELED' or 'FAILED'
         """
-        token = self.get_token()
-        header = {
-            'Authorization': f'_dremio{token}',
-            'Content-Type': 'application/json',
-            'cache-control': 'no-cache'
-        }
         result = None
-        max_tries = 300
-        while result not in ['COMPLETED', 'CANCELED', 'FAILED'] and max_tries > 0:
-            max_tries -= 1
-            response = requests.get(
-                url=self._url_jobstatus + id,
-                headers=header
+        delay = 0.05
+        max_delay = 5.0
+        deadline = time.monotonic() + 30 * 60
+        url = self._url_jobstatus + id
+        while result not in _TERMINAL_STATES and time.monotonic() < deadline:
+            response = self._authed_request(
+                'GET',
+                url=url,
             )
-            if response.status_code == requests.codes.ok:
-                result = response.json().get('jobState', None)
-            if result not in ['COMPLETED', 'CANCELED', 'FAILED']:
-                time.sleep(1)
+            if response.status_code == _OK:
+                result = orjson.loads(response.content).get('jobState', None)
+            if result not in _TERMINAL_STATES:
+                response.close()
+                time.sleep(delay + random.uniform(0, delay * 0.1))
+                delay = min(delay * 1.7, max_delay)
         if result:
             return result
         else:
             raise DremioException(response.text)
 
-    def run_sql(self, command: str) -> str:
+    def _submit_sql(self, command: str) -> str:
         """
-        Run a query into Dremio.
+        Submit a query to Dremio without waiting for it.
         :param command: sql query.
-        :return: 'COMPLETED', 'CANCELED' or 'FAILED'
+        :return: Job ID.
         """
-        token = self.get_token()
         payload = {
             'sql': command
         }
-        header = {
-            'Authorization': f'_dremio{token}',
-            'Content-Type': 'application/json',
-            'cache-control': 'no-cache'
-        }
-        response = requests.post(
-            url=self._url_sql,
-            json=payload,
-            headers=header
-        )
-        result = None
-        if response.status_code == requests.codes.ok:
-            job = response.json().get('id', None)
-            result = self.get_run_status(id=job)
-        if result:
-            return result
+        delay = 0.3
+        max_tries = 3
+        while True:
+            max_tries -= 1
+            response = self._authed_request(
+                'POST',
+                url=self._url_sql,
+                data=orjson.dumps(payload),
+            )
+            if response.status_code < 500 or max_tries == 0:
+                break
+            retry_after = response.headers.get('Retry-After')
+            if retry_after and retry_after.isdigit():
+                time.sleep(min(int(retry_after), 30))
+            else:
+                time.sleep(delay + random.uniform(0, delay * 0.1))
+                delay *= 2
+        job = None
+        if response.status_code == _OK:
+            job = orjson.loads(response.content).get('id', None)
+        if job:
+            return job
         else:
             raise DremioException(response.text)
 
+    def run_sql(self, command: str) -> str:
+        """
+        Run a query into Dremio.
+        :param command: sql query.
+        :return: 'COMPLETED', 'CANCELED' or 'FAILED'
+        """
+        job = self._submit_sql(command=command)
+        return self.get_run_status(id=job)
+
     def get_element_id(self, path: str) -> str:
         """
         Get Dremio element ID.
         :param path: path of element (like source/folder1/folder2/my_file.csv or source/folder1/folder2)
         :return: Dremio element ID
         """
-        path = path.replace('.', '/').replace(r'"', '')
-        token = self.get_token()
-        header = {
-            'Authorization': f'_dremio{token}',
-            'Content-Type': 'application/json',
-            'cache-control': 'no-cache'
-        }
+        path = path.translate(self._PATH_TABLE)
+        cached = self._path_id_cache.get(path)
+        if cached and time.monotonic() < cached[1]:
+            return cached[0]
         result = None
-        max_tries = 10
-        while not result and max_tries > 0:
-            max_tries -= 1
-            response = requests.get(
-                url=self._url_view + path,
-                headers=header
+        delay = 0.05
+        max_delay = 1.0
+        deadline = time.monotonic() + 5
+        url = self._url_view + path
+        while not result and time.monotonic() < deadline:
+            response = self._authed_request(
+                'GET',
+                url=url,
             )
-            if response.status_code == requests.codes.ok:
-                result = response.json().get('id', None)
+            if response.status_code == _OK:
+                result = orjson.loads(response.content).get('id', None)
             if not result:
-                time.sleep(.5)
+                time.sleep(delay + random.uniform(0, delay * 0.1))
+                delay = min(delay * 1.7, max_delay)
         if result:
+            self._path_id_cache[path] = (result, time.monotonic() + 300)
             return result
         else:
             raise DremioException(response.text)
 
+    def invalidate(self, path: str):
+        """
+        Forget the cached Dremio element ID of a path.
+        :param path: path of element (like source/folder1/folder2/my_file.csv or source/folder1/folder2)
+        """
+        path = path.translate(self._PATH_TABLE)
+        self._path_id_cache.pop(path, None)
+
     def create_documentation(self, element_id: str, text: str) -> str:
         """
         Create documentation for VDS.
@@ -206,23 +321,16 @@ class DremioWrapper:
         :param text: markdown text to be documented.
         :return: confirmation.
         """
-        logging.info(f'Creating or replacing documentation for {element_id}...')
-
-        token = self.get_token()
-        header = {
-            'Authorization': f'_dremio{token}',
-            'Content-Type': 'application/json',
-            'cache-control': 'no-cache'
-        }
+        _log.info('Creating or replacing documentation for %s...', element_id)
 
         # recovering version number
-        response = requests.get(
-            url=self._url_documentation.replace('@@@@@', element_id),
-            headers=header,
+        response = self._authed_request(
+            'GET',
+            url=self._url_documentation_tpl.format(eid=element_id),
         )
         version = None
-        if response.status_code == requests.codes.ok:
-            version = response.json().get('version', None)
+        if response.status_code == _OK:
+            version = orjson.loads(response.content).get('version', None)
         data = {
             'text': text
         }
@@ -230,16 +338,16 @@ class DremioWrapper:
             data['version'] = version
 
         result = None
-        response = requests.post(
-            url=self._url_documentation.replace('@@@@@', element_id),
-            headers=header,
-            json=data
+        response = self._authed_request(
+            'POST',
+            url=self._url_documentation_tpl.format(eid=element_id),
+            data=orjson.dumps(data)
         )
-        if response.status_code == requests.codes.ok:
-            logging.info(f'Documentation done!')
+        if response.status_code == _OK:
+            _log.info('Documentation done!')
             return 'ok'
         else:
-            logging.error(f'Documentation creation error: {response.text}')
+            _log.error('Documentation creation error: %s', response.text)
             raise DremioException(response.text)
 
     def create_or_replace_vds(self, vds_path: str, query: str, docs: str = None):
@@ -249,19 +357,102 @@ class DremioWrapper:
         :param query: sql query to mount VDS.
         :param docs: markdown text for documentation.
         """
-        logging.info(f'Creating or replacing VDS {vds_path}...')
+        _log.info('Creating or replacing VDS %s...', vds_path)
 
         qheader = f'CREATE OR REPLACE VDS {vds_path} AS'
         result = self.run_sql(
             command=f'{qheader} {query}',
         )
         if 'FAILED' in result:
-            logging.error(f'Creation failed! Error in query {query}')
+            _log.error('Creation failed! Error in query %s', query)
             raise DremioException(result)
         if docs:
             eid = self.get_element_id(path=vds_path)
             self.create_documentation(element_id=eid, text=docs)
-        logging.info('VDS done!')
+        _log.info('VDS done!')
+
+    def create_or_replace_vds_many(self, specs: list) -> dict:
+        """
+        Create (or replace) many VDS, submitting every query before waiting for any of them.
+        :param specs: list of dicts with the create_or_replace_vds arguments (vds_path, query and optionally docs).
+        :return: dict with the 'done' VDS paths and the 'failed' ones mapped to their error.
+        """
+        self.get_token()
+        done = []
+        failed = {}
+
+        # submitting all jobs
+        jobs = {}
+        for spec in specs:
+            vds_path = spec['vds_path']
+            _log.info('Creating or replacing VDS %s...', vds_path)
+            try:
+                job = self._submit_sql(command=f'CREATE OR REPLACE VDS {vds_path} AS {spec["query"]}')
+                jobs[self._url_jobstatus + job] = spec
+            except DremioException as e:
+                failed[vds_path] = e.message
+            except requests.RequestException as e:
+                failed[vds_path] = str(e)
+
+        # waiting for all jobs at once
+        completed = []
+        delay = 0.05
+        max_delay = 5.0
+        deadline = time.monotonic() + 30 * 60
+        while jobs and time.monotonic() < deadline:
+            for url, spec in list(jobs.items()):
+                try:
+                    response = self._authed_request(
+                        'GET',
+                        url=url,
+                    )
+                except (DremioException, requests.RequestException) as e:
+                    failed[spec['vds_path']] = str(e)
+                    del jobs[url]
+                    continue
+                if response.status_code != _OK:
+                    # purged or invalid jobs will not come back, only wait on timeouts and throttling
+                    if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+                        failed[spec['vds_path']] = response.text
+                        del jobs[url]
+                    continue
+                try:
+                    result = orjson.loads(response.content).get('jobState', None)
+                except ValueError as e:
+                    failed[spec['vds_path']] = str(e)
+                    del jobs[url]
+                    continue
+                if result == 'COMPLETED':
+                    completed.append(spec)
+                elif result in _TERMINAL_STATES:
+                    _log.error('Creation failed! Error in query %s', spec['query'])
+                    failed[spec['vds_path']] = result
+                else:
+                    continue
+                del jobs[url]
+            if jobs:
+                time.sleep(delay + random.uniform(0, delay * 0.1))
+                delay = min(delay * 1.7, max_delay)
+        for spec in jobs.values():
+            failed[spec['vds_path']] = 'TIMEOUT'
+
+        # documenting
+        for spec in completed:
+            vds_path = spec['vds_path']
+            try:
+                if spec.get('docs'):
+                    eid = self.get_element_id(path=vds_path)
+                    self.create_documentation(element_id=eid, text=spec['docs'])
+                done.append(vds_path)
+            except DremioException as e:
+                failed[vds_path] = e.message
+            except requests.RequestException as e:
+                failed[vds_path] = str(e)
+        _log.info('%s VDS done, %s failed!', len(done), len(failed))
+        return {
+            'done': done,
+            'failed': failed
+        }
 
     def refresh_parquet_pds(self, pds_path: str) -> str:
         """
@@ -269,47 +460,46 @@ class DremioWrapper:
         :param pds_path: path of PDS.
         :return: confirmation.
         """
-        pds_path = pds_path.replace('.', '/').replace(r'"', '')
-        logging.info('Checking already existing PDS...')
+        pds_path = pds_path.translate(self._PATH_TABLE)
+        path_parts = pds_path.split('/')
+        _log.info('Checking already existing PDS...')
         element_id_antigo = self.get_element_id(path=pds_path)
+        # folders not yet promoted to a dataset have a path based ID, like dremio:/source/folder
         if pds_path not in element_id_antigo:
-            logging.info('Removing old PDS...')
+            _log.info('Removing old PDS...')
             try:
                 self.delete_element(element_id_antigo)
-                logging.info('Old PDS removed!')
+                _log.info('Old PDS removed!')
             except DremioException:
-                logging.info('PDS not found...')
+                _log.info('PDS not found...')
+            self.invalidate(pds_path)
             element_id = self.get_element_id(path=pds_path)
         else:
-            logging.info('PDS not found...')
+            _log.info('PDS not found...')
             element_id = element_id_antigo
 
-        logging.info('Creating new PDS...')
-        token = self.get_token()
+        _log.info('Creating new PDS...')
         payload = {
             'entityType': 'dataset',
             'id': element_id,
-            'path': pds_path.split('/'),
+            'path': path_parts,
             'type': 'PHYSICAL_DATASET',
             'format': {
                 'type': 'Parquet'
             }
         }
-        header = {
-            'Authorization': f'_dremio{token}',
-            'Content-Type': 'application/json',
-            'cache-control': 'no-cache'
-        }
         element_id_quoted = quote(element_id, safe='')
-        response = requests.post(
-            url=self._url_refresh_pds.replace('@@@@@', element_id_quoted),
-            json=payload,
-            headers=header
+        response = self._authed_request(
+            'POST',
+            url=self._url_refresh_pds_tpl.format(eid=element_id_quoted),
+            data=orjson.dumps(payload),
         )
         result = None
-        if response.status_code == requests.codes.ok:
-            result = response.json().get('id', None)
+        if response.status_code == _OK:
+            result = orjson.loads(response.content).get('id', None)
         else:
             raise DremioException(response.text)
-        logging.info('Done!')
+        # the promoted dataset gets a new ID
+        self.invalidate(pds_path)
+        _log.info('Done!')
         return result
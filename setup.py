@@ -23,9 +23,16 @@ setup(
         'certifi==2021.5.30',
         'charset-normalizer==2.0.6',
         'idna==3.2',
+        'orjson==3.6.4',
         'requests==2.26.0',
         'urllib3==1.26.6',
     ],
+    extras_require={
+        'async': [
+            'aiohttp==3.8.1',
+            'aiolimiter==1.0.0',
+        ],
+    },
     classifiers=[
         'Development Status :: 5 - Production/Stable',
         'Intended Audience :: Developers',